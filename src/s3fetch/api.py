@@ -1,14 +1,18 @@
 """Public API for S3Fetch."""
 
+from __future__ import annotations
+
+import re
 import threading
 from pathlib import Path
-from typing import Callable, Optional, Tuple
-
-from mypy_boto3_s3.client import S3Client
+from typing import TYPE_CHECKING, Callable, Optional, Tuple, Union
 
 from . import s3
 from .s3 import S3FetchQueue
 
+if TYPE_CHECKING:
+    from mypy_boto3_s3.client import S3Client
+
 
 def list_objects(
     bucket: str,
@@ -16,9 +20,9 @@ def list_objects(
     client: S3Client,
     download_queue: S3FetchQueue,
     delimiter: str,
-    regex: Optional[str],
+    regex: Optional[Union[str, re.Pattern]],
     exit_event: threading.Event,
-) -> None:
+) -> threading.Thread:
     """Starts a seperate thread that lists of objects from the specified S3 bucket.
 
     Starts a seperate thread that lists of objects from the specified S3 bucket
@@ -31,10 +35,14 @@ def list_objects(
         client (S3Client): Boto3 S3 client object.
         download_queue (S3FetchQueue): FIFO download queue.
         delimiter (str): Delimiter for the logical folder hierarchy.
-        regex (Optional[str]): Regular expression to use for filtering objects.
+        regex (Optional[Union[str, re.Pattern]]): Regular expression to use for
+            filtering objects.
         exit_event (threading.Event): Notify that script to exit.
+
+    Returns:
+        threading.Thread: The started list objects thread.
     """
-    s3.create_list_objects_thread(
+    return s3.create_list_objects_thread(
         bucket=bucket,
         prefix=prefix,
         client=client,
@@ -57,6 +65,7 @@ def download_objects(
     delimiter: str,
     download_config: dict,
     callback: Callable,
+    dry_run: bool = False,
 ) -> Tuple[int, list]:
     """Download objects from S3 bucket.
 
@@ -72,6 +81,8 @@ def download_objects(
         delimiter (str): S3 object key delimiter.
         download_config (dict): Download configuration.
         callback (Callable): Callback function.
+        dry_run (bool, optional): List objects only, do not download them. Defaults to
+            False.
 
     Returns:
         Tuple[int, list]: Number of successful downloads and list of failed downloads.
@@ -88,6 +99,7 @@ def download_objects(
         delimiter=delimiter,
         download_config=download_config,
         callback=callback,
+        dry_run=dry_run,
     )
 
     success, failures = stats
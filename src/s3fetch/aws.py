@@ -1,11 +1,16 @@
 """This module contains functions to interact with AWS."""
 
+from __future__ import annotations
+
 import logging
+from typing import TYPE_CHECKING
 
 import boto3
 import botocore
 from botocore.endpoint import MAX_POOL_CONNECTIONS
-from mypy_boto3_s3.client import S3Client
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3.client import S3Client
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +44,6 @@ from .exceptions import S3FetchError
     help="Specify the \"directory\" delimiter. Defaults to '/'.",
 )
 @click.option("-q", "--quiet", is_flag=True, help="Don't print to stdout.")
-@click.option("--version", is_flag=True, help="Print out version information.")
 def cli(
     s3_uri: str,
     region: str,
@@ -55,7 +54,6 @@ def cli(
     dry_run: bool,
     delimiter: str,
     quiet: bool,
-    version: bool,
 ) -> None:
     """Easily download objects from an S3 bucket.
 
@@ -113,6 +111,7 @@ def cli(
             delimiter=delimiter,
             download_config=download_config,
             callback=file_downloaded_callback,
+            dry_run=dry_run,
         )
     except KeyboardInterrupt:
         pass
@@ -65,3 +65,9 @@ class PrefixDoesNotExistError(S3FetchError):
     """Raised when the prefix does not exist."""
 
     pass
+
+
+class PathTraversalError(S3FetchError):
+    """Raised when an object key would be written outside the download directory."""
+
+    pass
@@ -1,15 +1,42 @@
 """Filesystem utilities for S3Fetch."""
 
+import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Set
 
-from .exceptions import DirectoryDoesNotExistError
+from .exceptions import DirectoryDoesNotExistError, PathTraversalError
+
+
+class CreatedDirectories:
+    """Thread safe record of the directories created during a single download run."""
+
+    def __init__(self) -> None:  # noqa: D107
+        self.directories: Set[Path] = set()
+        self.lock = threading.Lock()
+
+    def create(self, directory: Path) -> None:
+        """Create the directory and any missing parents, if not already created.
+
+        Objects sharing a prefix share a destination directory, so the mkdir syscalls
+        are only made the first time each directory is seen during the run.
+
+        Args:
+            directory (Path): Directory to create.
+        """
+        with self.lock:
+            if directory in self.directories:
+                return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            self.directories.add(directory)
 
 
 def create_destination_directory(
     download_dir: Path,
     object_dir: Optional[str],
     delimiter: str,
+    created_directories: Optional[CreatedDirectories] = None,
 ) -> Path:
     """Create the local destination directory for the object.
 
@@ -18,25 +45,63 @@ def create_destination_directory(
         object_dir (Union[str, Path]): The directory structure we will create for the
             object under the base download directory.
         delimiter (str): The delimiter used to split the object key into directories.
+        created_directories (Optional[CreatedDirectories], optional): Directories
+            already created during this download run, which are not created again.
+            Defaults to None, always creating the directory.
 
     Returns:
         Path: The absolute path to the local destination directory.
     """
-    # Build the absolute directory path converting the object delimiter into a local
-    # directory delimiter.
-    if object_dir:
-        directories = object_dir.split(delimiter)
-        tmp_dir = Path()
-        for directory in directories:
-            tmp_dir = tmp_dir / Path(directory)
-        absolute_directory = download_dir / Path(tmp_dir)
+    absolute_directory = download_dir / get_relative_directory(object_dir, delimiter)
+    if created_directories is None:
+        absolute_directory.mkdir(parents=True, exist_ok=True)
     else:
-        absolute_directory = download_dir
-
-    absolute_directory.mkdir(parents=True, exist_ok=True)
+        created_directories.create(absolute_directory)
     return absolute_directory
 
 
+def get_relative_directory(object_dir: Optional[str], delimiter: str) -> Path:
+    """Convert the object directory into a path relative to the download directory.
+
+    Args:
+        object_dir (Optional[str]): The object directory, e.g. `my:test:prefix`.
+        delimiter (str): The delimiter used to split the object key into directories.
+
+    Returns:
+        Path: The relative local directory, e.g. `my/test/prefix`.
+    """
+    if not object_dir:
+        return Path()
+    if delimiter == "/":
+        # pathlib already splits on "/" so there's no need to split the key.
+        return Path(object_dir.lstrip(delimiter))
+    return Path(*object_dir.split(delimiter))
+
+
+def check_for_path_traversal(relative_path: Path) -> None:
+    """Check a path relative to the download directory stays within it.
+
+    Only string operations are used, no filesystem calls, as this is called for every
+    object downloaded.
+
+    Args:
+        relative_path (Path): Object destination relative to the download directory.
+
+    Raises:
+        PathTraversalError: If the path is absolute or uses '..' to climb above the
+            download directory.
+    """
+    normalised_path = os.path.normpath(relative_path)
+    if (
+        os.path.isabs(normalised_path)
+        or normalised_path == os.pardir
+        or normalised_path.startswith(os.pardir + os.sep)
+    ):
+        raise PathTraversalError(
+            f"The object path '{relative_path}' is outside the download directory."
+        )
+
+
 def check_download_dir_exists(download_dir: Path) -> None:
     """Check if the download directory exists.
 
@@ -1,17 +1,19 @@
 """This module contains functions to interact with AWS S3."""
 
+from __future__ import annotations
+
+import functools
 import logging
 import re
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from queue import Queue
-from typing import Callable, Generator, Optional, Tuple
+from queue import Empty, Queue
+from typing import TYPE_CHECKING, Callable, Generator, Optional, Tuple, Union
 
 import boto3
 from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
-from mypy_boto3_s3.client import S3Client
 
 from s3fetch.exceptions import (
     InvalidCredentialsError,
@@ -23,18 +25,32 @@ from s3fetch.exceptions import (
 from . import fs
 from .exceptions import S3FetchQueueClosed, S3FetchQueueEmpty
 
+if TYPE_CHECKING:
+    from mypy_boto3_s3.client import S3Client
+
 logger = logging.getLogger(__name__)
 
 # Would be nice to be able to pull this from `s3transfer` package but
 # the default of 10 is specified as a parameter default on the TransferConfig class.
 DEFAULT_S3TRANSFER_CONCURRENCY = 10
 
+# Size of the chunks read from the download stream and written to disk. The
+# `s3transfer` default of 256KiB means many small writes for large objects.
+DEFAULT_S3TRANSFER_IO_CHUNKSIZE = 1024 * 1024
+
+# S3 error codes that are re-raised as a more specific S3Fetch exception.
+CLIENT_ERROR_EXCEPTIONS = {
+    "InvalidAccessKeyId": InvalidCredentialsError,
+    "AccessDenied": PermissionError,
+}
+
 
 class S3FetchQueue:
     """Wrapper around a standard Python FIFO queue."""
 
     def __init__(self):  # noqa: D107
         self.queue = Queue()
+        self.closed = False
 
     def put(self, key: Optional[str]) -> None:
         """Add object key to the download queue."""
@@ -48,15 +64,47 @@ class S3FetchQueue:
 
         Raises:
             S3FetchQueueEmpty: Raised when the queue is empty.
+            S3FetchQueueClosed: Raised when the queue has been closed. Once the
+                sentinel message has been received every subsequent call raises this
+                without touching the underlying queue.
 
         Returns:
             str: S3 object key.
         """
-        key = self.queue.get(block=block)
+        if self.closed:
+            raise S3FetchQueueClosed
+        try:
+            key = self.queue.get(block=block)
+        except Empty as e:
+            raise S3FetchQueueEmpty from e
         if key is None:
+            self.closed = True
             raise S3FetchQueueClosed
         return key
 
+    def drain(self) -> list:
+        """Remove and return all object keys currently in the queue.
+
+        The queue lock is only acquired once, rather than once per key. If the queue
+        has been closed the sentinel message is left in place so subsequent calls to
+        `get()` still raise `S3FetchQueueClosed`. Drained keys count as processed, as
+        if `task_done()` had been called for each, so `join()` doesn't wait on them.
+
+        Returns:
+            list: S3 object keys in FIFO order.
+        """
+        with self.queue.mutex:
+            items = self.queue.queue
+            keys = []
+            while items and items[0] is not None:
+                keys.append(items.popleft())
+            if keys:
+                self.queue.unfinished_tasks -= len(keys)
+                if not self.queue.unfinished_tasks:
+                    self.queue.all_tasks_done.notify_all()
+                self.queue.not_full.notify(len(keys))
+        return keys
+
     def close(self) -> None:
         """Close queue by adding a sentinel message of None onto the download queue."""
         self.queue.put(None)
@@ -88,9 +136,9 @@ def create_list_objects_thread(
     client: S3Client,
     download_queue: S3FetchQueue,
     delimiter: str,
-    regex: Optional[str],
+    regex: Optional[Union[str, re.Pattern]],
     exit_event: threading.Event,
-) -> None:
+) -> threading.Thread:
     """Starts a seperate thread that lists of objects from the specified S3 bucket.
 
     Starts a seperate thread that lists of objects from the specified S3 bucket
@@ -103,10 +151,14 @@ def create_list_objects_thread(
         client (S3Client): Boto3 S3 client object.
         download_queue (S3FetchQueue): FIFO download queue.
         delimiter (str): Delimiter for the logical folder hierarchy.
-        regex (Optional[str]): Regular expression to use for filtering objects.
+        regex (Optional[Union[str, re.Pattern]]): Regular expression to use for
+            filtering objects.
         exit_event (threading.Event): Notify that script to exit.
+
+    Returns:
+        threading.Thread: The started list objects thread.
     """
-    threading.Thread(
+    thread = threading.Thread(
         name="list_objects",
         target=list_objects,
         kwargs={
@@ -118,7 +170,9 @@ def create_list_objects_thread(
             "regex": regex,
             "exit_event": exit_event,
         },
-    ).start()
+    )
+    thread.start()
+    return thread
 
 
 def create_download_threads(
@@ -133,6 +187,7 @@ def create_download_threads(
     delimiter: str,
     download_config: dict,
     callback: Optional[Callable] = None,
+    dry_run: bool = False,
 ) -> Tuple[int, list]:
     """Create download threads.
 
@@ -148,12 +203,16 @@ def create_download_threads(
         delimiter (str): S3 object key delimiter, e.g. `/`.
         download_config (dict): Download configuration.
         callback (Optional[Callable], optional): Callback function. Defaults to None.
+        dry_run (bool, optional): List objects only, do not download them. Defaults to
+            False.
 
     Returns:
         Tuple[int, list]: _description_
     """
     successful_downloads = 0
     failed_downloads: list[str] = []
+    # Only remembered for this run, as directories may be removed between runs.
+    created_directories = fs.CreatedDirectories()
     with ThreadPoolExecutor(max_workers=threads) as executor:
         try:
             futures = {}
@@ -172,8 +231,10 @@ def create_download_threads(
                         download_dir=download_dir,
                         download_config=download_config,
                         completed_queue=completed_queue,
+                        dry_run=dry_run,
+                        created_directories=created_directories,
                     )
-                except S3FetchQueueEmpty:
+                except S3FetchQueueClosed:
                     break
 
             successful_downloads, failed_downloads = generate_stats(futures)
@@ -211,7 +272,7 @@ def list_objects(
     bucket: str,
     prefix: str,
     delimiter: str,
-    regex: Optional[str],
+    regex: Optional[Union[str, re.Pattern]],
     exit_event: threading.Event,
 ) -> None:
     """List objects in an S3 bucket prefixed by `prefix`.
@@ -222,12 +283,18 @@ def list_objects(
         bucket (str): S3 bucket name.
         prefix (str): Download objects starting with this prefix.
         delimiter (str): Delimiter for the logical folder hierarchy.
-        regex (Optional[str]): Regular expression to use for filtering objects.
+        regex (Optional[Union[str, re.Pattern]]): Regular expression to use for
+            filtering objects.
         exit_event (threading.Event): Notify that script to exit.
 
     Raises:
         InvalidCredentialsError: Raised if AWS credentials are invalid.
+        RegexError: Raised if the regex cannot be compiled.
     """
+    # Compile the regex up front rather than looking it up for every object key.
+    if isinstance(regex, str):
+        regex = compile_regex(regex)
+
     try:
         for obj_key in paginate_objects(client=client, bucket=bucket, prefix=prefix):
             if exit_requested(exit_event):
@@ -240,12 +307,11 @@ def list_objects(
             add_object_to_download_queue(obj_key, queue)
         close_download_queue(queue)
     except ClientError as e:
-        if e.response.get("Error", {}).get("Code") == "InvalidAccessKeyId":
-            raise InvalidCredentialsError(e) from e
-        elif e.response.get("Error", {}).get("Code") == "AccessDenied":
-            raise PermissionError(e) from e
-        else:
+        error_code = e.response.get("Error", {}).get("Code", "")
+        exception = CLIENT_ERROR_EXCEPTIONS.get(error_code)
+        if exception is None:
             raise e
+        raise exception(e) from e
     logger.debug("Finished adding objects to download queue")
 
 
@@ -277,12 +343,13 @@ def exit_requested(exit_event: threading.Event) -> bool:
     Returns:
         bool: True if the exit_event has been set, False otherwise.
     """
-    if exit_event.is_set():
-        return True
-    return False
+    # Event.is_set() only reads a flag, it doesn't acquire the Event's lock.
+    return exit_event.is_set()
 
 
-def exclude_object(key: str, delimiter: str, regex: Optional[str]) -> bool:
+def exclude_object(
+    key: str, delimiter: str, regex: Optional[Union[str, re.Pattern]]
+) -> bool:
     """Determines if an S3 object should be added to the download queue.
 
     This is a wrapper for checking if the object key should be added to the download
@@ -292,7 +359,8 @@ def exclude_object(key: str, delimiter: str, regex: Optional[str]) -> bool:
     Args:
         key (str): S3 object key.
         delimiter (str): Object key 'folder' delimiter.
-        regex (Optional[str]): Python compatible regular expression.
+        regex (Optional[Union[str, re.Pattern]]): Python compatible regular
+            expression, either as a string or pre-compiled.
 
     Returns:
         bool: Returns True if the object should be downloaded, False otherwise.
@@ -322,7 +390,7 @@ def check_if_key_is_directory(key: str, delimiter: str) -> bool:
     return False
 
 
-def filter_by_regex(key: str, regex: str) -> bool:
+def filter_by_regex(key: str, regex: Union[str, re.Pattern]) -> bool:
     """Filter objects by regular expression.
 
     If an object matches the regex then it is included in the list of objects to
@@ -330,7 +398,8 @@ def filter_by_regex(key: str, regex: str) -> bool:
 
     Args:
         key (str): S3 object key.
-        regex (str): Python compatible regular expression.
+        regex (Union[str, re.Pattern]): Python compatible regular expression. A
+            pre-compiled pattern is used as-is.
 
     Raises:
         RegexError: Raised when the regex cannot be compiled due to an error.
@@ -338,16 +407,35 @@ def filter_by_regex(key: str, regex: str) -> bool:
     Returns:
         bool: True if the regex matches the object key, False otherwise.
     """
-    try:
-        rexp = re.compile(rf"{regex}")
-    except re.error as e:
-        raise RegexError from e
+    if isinstance(regex, re.Pattern):
+        rexp = regex
+    else:
+        rexp = compile_regex(regex)
 
     if rexp.search(key):
         return True
     return False
 
 
+@functools.lru_cache(maxsize=256)
+def compile_regex(regex: str) -> re.Pattern:
+    """Compile a regular expression, caching the compiled pattern.
+
+    Args:
+        regex (str): Python compatible regular expression.
+
+    Raises:
+        RegexError: Raised when the regex cannot be compiled due to an error.
+
+    Returns:
+        re.Pattern: Compiled regular expression.
+    """
+    try:
+        return re.compile(rf"{regex}")
+    except re.error as e:
+        raise RegexError from e
+
+
 def add_object_to_download_queue(key: str, queue: S3FetchQueue) -> None:
     """Add S3 object to download queue.
 
@@ -423,13 +511,12 @@ def rollup_object_key_by_prefix(prefix: str, delimiter: str, key: str) -> str:
     if not key.startswith(prefix):
         raise PrefixDoesNotExistError("Prefix not found in key")
 
-    if prefix == "":
+    # The key starts with the prefix, so the last delimiter in the prefix is also
+    # where the rolled up key starts. Slicing avoids splitting the whole key.
+    index = prefix.rfind(delimiter)
+    if index == -1:
         return key
-
-    # TODO: Can this be made simpler?
-    delimiter_count = prefix.count(delimiter)
-    tmp_key = key.split(delimiter, maxsplit=delimiter_count)[-1]
-    return tmp_key
+    return key[index + len(delimiter) :]
 
 
 def split_object_key_into_dir_and_file(
@@ -455,6 +542,8 @@ def split_object_key_into_dir_and_file(
 def create_s3_transfer_config(
     use_threads: bool = True,
     max_concurrency: int = 10,
+    io_chunksize: int = DEFAULT_S3TRANSFER_IO_CHUNKSIZE,
+    max_bandwidth: Optional[int] = None,
 ) -> TransferConfig:  # type: ignore
     """Create a boto3.s3.transfer.TransferConfig object.
 
@@ -462,6 +551,10 @@ def create_s3_transfer_config(
         use_threads (bool, optional): Use threads. Defaults to True.
         max_concurrency (int, optional): How many threads should be used _per object_
             download. Defaults to 10.
+        io_chunksize (int, optional): Size in bytes of each chunk read from the
+            download stream. Defaults to 1MiB.
+        max_bandwidth (Optional[int], optional): Maximum bandwidth in bytes per second
+            used per object download. Defaults to None (unlimited).
 
     Returns:
         boto3.s3.transfer.TransferConfig: TransferConfig object.
@@ -469,6 +562,8 @@ def create_s3_transfer_config(
     s3transfer_config = boto3.s3.transfer.TransferConfig(  # type: ignore
         use_threads=use_threads,
         max_concurrency=max_concurrency,
+        io_chunksize=io_chunksize,
+        max_bandwidth=max_bandwidth,
     )
     return s3transfer_config
 
@@ -544,6 +639,8 @@ def download(
     download_config: dict,
     completed_queue: S3FetchQueue,
     callback: Optional[Callable] = None,
+    dry_run: bool = False,
+    created_directories: Optional[fs.CreatedDirectories] = None,
 ) -> None:
     """Download an object from S3.
 
@@ -561,9 +658,14 @@ def download(
         prefix (str): S3 object key prefix, e.g. `my/test/objects/`.
         download_config (dict): Download configuration.
         completed_queue (S3FetchQueue): Completed download queue.
+        dry_run (bool, optional): Don't download the object. Defaults to False.
+        created_directories (Optional[fs.CreatedDirectories], optional): Directories
+            already created during this download run. Defaults to None.
 
     Raises:
         PermissionError: Raised when there is a permission error.
+        PathTraversalError: Raised when the object would be written outside the
+            download directory.
     """
     if exit_event.is_set():
         logger.debug("Not downloading %s as exit_event is set", key)
@@ -571,10 +673,24 @@ def download(
 
     dst_dir, dst_file = process_key(key=key, prefix=prefix, delimiter=delimiter)
 
+    # Check the whole destination, as with a delimiter other than "/" the filename
+    # itself can also contain a path, e.g. `../../evil`. This is done before the dry
+    # run check so a dry run reports the same unsafe keys as a real run.
+    fs.check_for_path_traversal(
+        fs.get_relative_directory(dst_dir, delimiter) / dst_file
+    )
+
+    # Skip creating the local directories as well as the download itself.
+    if dry_run:
+        logger.debug(f"Not downloading {key} as dry run is enabled")
+        completed_queue.put(key)
+        return
+
     absolute_dest_dir = fs.create_destination_directory(
         download_dir=download_dir,
         object_dir=dst_dir,
         delimiter=delimiter,
+        created_directories=created_directories,
     )
 
     dest_filename = absolute_dest_dir / dst_file
@@ -602,7 +718,7 @@ def trim_schema_from_uri(uri: str) -> str:
     Returns:
         str: URI without the schema.
     """
-    return uri.replace("s3://", "", 1)
+    return uri.removeprefix("s3://")
 
 
 def split_uri_into_bucket_and_prefix(s3_uri: str, delimiter: str) -> Tuple[str, str]:
@@ -616,10 +732,6 @@ def split_uri_into_bucket_and_prefix(s3_uri: str, delimiter: str) -> Tuple[str,
     :rtype: Tuple[str, str]
     """
     tmp_path = trim_schema_from_uri(s3_uri)
-    try:
-        bucket, prefix = tmp_path.split(delimiter, maxsplit=1)
-    except ValueError:
-        bucket = tmp_path
-        prefix = ""
+    bucket, _, prefix = tmp_path.partition(delimiter)
     logger.debug(f"Split S3 URI into bucket={bucket}, prefix={prefix}")
     return bucket, prefix
@@ -1,59 +1,68 @@
 """End 2 End Tests for S3Fetch."""
-# from pathlib import Path
-
-# import pytest
-# from s3fetch.command import S3Fetch
-
-# @pytest.fixture()
-# def bucket_config() -> dict:
-#     config = {
-#         "bucket": "s3://s3fetch-testing-us-east-2",
-#         "region": "us-east-2",
-#     }
-#     return config
-
-
-# def test_downloading_single_small_file(bucket_config, tmp_path):
-#     config = {
-#         "s3_uri": f"{bucket_config['bucket']}/small_files/01_small_test_file",
-#         "region": bucket_config["region"],
-#         "download_dir": tmp_path,
-#     }
-#     s3fetch = S3Fetch(**config)
-#     s3fetch.run()
-#     testfile = Path(tmp_path) / "01_small_test_file"
-#     assert testfile.is_file()
-#     file_contents = testfile.read_text()
-#     assert file_contents == "This is the first test file.\n"
-
-
-# def test_only_single_small_file_is_downloaded(bucket_config, tmp_path):
-#     config = {
-#         "s3_uri": f"{bucket_config['bucket']}/small_files/01_small_test_file",
-#         "region": bucket_config["region"],
-#         "download_dir": tmp_path,
-#     }
-#     s3fetch = S3Fetch(**config)
-#     s3fetch.run()
-#     download_dir = Path(tmp_path)
-#     assert len([download_dir.iterdir()]) == 1
-
-
-# def test_downloading_single_small_file_in_sub_directory(bucket_config, tmp_path):
-#     config = {
-#         "s3_uri": f"{bucket_config['bucket']}/small_files",
-#         "region": bucket_config["region"],
-#         "download_dir": tmp_path,
-#     }
-#     s3fetch = S3Fetch(**config)
-#     s3fetch.run()
-#     sub_dir = Path(tmp_path) / "small_files"
-#     testfile = sub_dir / "01_small_test_file"
-#     assert sub_dir.is_dir()
-#     assert testfile.is_file()
-#     file_contents = testfile.read_text()
-#     assert file_contents == "This is the first test file.\n"
-
-
-def test_dummy_test():
-    assert True
+
+import os
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from s3fetch.cli import cli
+
+# These tests download from a real bucket so need AWS credentials with access to it.
+# Set S3FETCH_E2E to run them, e.g. `hatch run test_e2e`.
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("S3FETCH_E2E"),
+    reason="set S3FETCH_E2E to run against the s3fetch testing bucket",
+)
+
+
+@pytest.fixture()
+def bucket_config() -> dict:
+    config = {
+        "bucket": "s3://s3fetch-testing-us-east-2",
+        "region": "us-east-2",
+    }
+    return config
+
+
+def run_s3fetch(s3_uri: str, region: str, download_dir: Path) -> None:
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, [s3_uri, "--region", region, "--download-dir", str(download_dir)]
+    )
+    assert result.exit_code == 0, result.output
+
+
+def test_downloading_single_small_file(bucket_config, tmp_path):
+    run_s3fetch(
+        s3_uri=f"{bucket_config['bucket']}/small_files/01_small_test_file",
+        region=bucket_config["region"],
+        download_dir=tmp_path,
+    )
+    testfile = tmp_path / "01_small_test_file"
+    assert testfile.is_file()
+    file_contents = testfile.read_text()
+    assert file_contents == "This is the first test file.\n"
+
+
+def test_only_single_small_file_is_downloaded(bucket_config, tmp_path):
+    run_s3fetch(
+        s3_uri=f"{bucket_config['bucket']}/small_files/01_small_test_file",
+        region=bucket_config["region"],
+        download_dir=tmp_path,
+    )
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_downloading_single_small_file_in_sub_directory(bucket_config, tmp_path):
+    run_s3fetch(
+        s3_uri=f"{bucket_config['bucket']}/small_files",
+        region=bucket_config["region"],
+        download_dir=tmp_path,
+    )
+    sub_dir = tmp_path / "small_files"
+    testfile = sub_dir / "01_small_test_file"
+    assert sub_dir.is_dir()
+    assert testfile.is_file()
+    file_contents = testfile.read_text()
+    assert file_contents == "This is the first test file.\n"
@@ -1,15 +1,17 @@
 """S3Fetch conftest."""
 
-import os
+from typing import Generator
 
 import pytest
 
 
 @pytest.fixture(scope="package", autouse=True)
-def aws_credentials():
-    """Mock AWS Credentials for Moto."""
-    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
-    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"  # noqa: S105
-    os.environ["AWS_SECURITY_TOKEN"] = "testing"  # noqa: S105
-    os.environ["AWS_SESSION_TOKEN"] = "testing"  # noqa: S105
-    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+def aws_credentials() -> Generator:
+    """Mock AWS Credentials for Moto, restoring the environment afterwards."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("AWS_ACCESS_KEY_ID", "testing")
+        mp.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        mp.setenv("AWS_SECURITY_TOKEN", "testing")
+        mp.setenv("AWS_SESSION_TOKEN", "testing")
+        mp.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        yield
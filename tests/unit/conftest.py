@@ -1,24 +1,46 @@
-import os
+import threading
 from typing import Generator
 
 import boto3
 import pytest
 from moto import mock_aws
+from moto.core.models import MockAWS
+from mypy_boto3_s3.client import S3Client
 
 
 @pytest.fixture(scope="package", autouse=True)
-def aws_credentials() -> None:
-    """Mock AWS Credentials for Moto."""
-    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
-    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"  # noqa: S105
-    os.environ["AWS_SECURITY_TOKEN"] = "testing"  # noqa: S105
-    os.environ["AWS_SESSION_TOKEN"] = "testing"  # noqa: S105
-    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+def aws_credentials() -> Generator:
+    """Mock AWS Credentials for Moto, restoring the environment afterwards."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("AWS_ACCESS_KEY_ID", "testing")
+        mp.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        mp.setenv("AWS_SECURITY_TOKEN", "testing")
+        mp.setenv("AWS_SESSION_TOKEN", "testing")
+        mp.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        yield
+
+
+@pytest.fixture(scope="package")
+def moto_mock() -> Generator:
+    """Start the moto mock once for the whole package."""
+    with mock_aws() as mock:
+        yield mock
+
+
+@pytest.fixture(scope="package")
+def package_s3_client(moto_mock: MockAWS) -> S3Client:
+    """Return a mock S3Client object shared by every test in the package."""
+    return boto3.client("s3", region_name="us-east-1")
+
+
+@pytest.fixture()
+def s3_client(moto_mock: MockAWS, package_s3_client: S3Client) -> Generator:
+    """Return the shared mock S3Client object, resetting moto's state afterwards."""
+    yield package_s3_client
+    moto_mock.reset()
 
 
 @pytest.fixture()
-def s3_client(scope="package") -> Generator:  # noqa: ANN001
-    """Return a mock S3Client object."""
-    with mock_aws():
-        client = boto3.client("s3", region_name="us-east-1")
-        yield client
+def exit_event() -> threading.Event:
+    """Return a new, unset exit event."""
+    return threading.Event()
@@ -0,0 +1,19 @@
+import pytest
+
+from s3fetch import aws
+
+
+@pytest.mark.parametrize(
+    "threads, max_concurrency, expected_result",
+    [
+        (1, 1, 10),
+        (1, 10, 10),
+        (4, 10, 40),
+        (100, 10, 1000),
+    ],
+)
+def test_calc_connection_pool_size(
+    threads: int, max_concurrency: int, expected_result: int
+):
+    result = aws.calc_connection_pool_size(threads, max_concurrency)
+    assert result == expected_result
@@ -0,0 +1,18 @@
+from click.testing import CliRunner
+
+from s3fetch import __version__
+from s3fetch.cli import cli
+
+
+def test_printing_version():
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--version"])
+    assert result.exit_code == 0
+    assert result.output == f"{cli.name}, version {__version__}\n"
+
+
+def test_version_option_is_only_listed_once():
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--help"])
+    assert result.exit_code == 0
+    assert result.output.count("--version") == 1
@@ -1,6 +1,10 @@
+import shutil
+from pathlib import Path
+
 import pytest
 
 from s3fetch import fs
+from s3fetch.exceptions import PathTraversalError
 
 
 @pytest.mark.parametrize(
@@ -22,3 +26,63 @@ def test_creating_destination_directory(tmp_path, object_dir, delimiter, expecte
         expected_dir = tmp_path
     assert expected_dir == result
     assert expected_dir.is_dir()
+
+
+@pytest.mark.parametrize(
+    "object_dir, delimiter",
+    [
+        ("..", "/"),
+        ("../../etc", "/"),
+        ("my/../../prefix", "/"),
+        ("my:..:..:prefix", ":"),
+    ],
+    ids=["parent", "deep", "sibling", "custom_delimiter"],
+)
+def test_path_traversal_raises_exception(object_dir, delimiter):
+    relative_directory = fs.get_relative_directory(object_dir, delimiter)
+    with pytest.raises(PathTraversalError):
+        fs.check_for_path_traversal(relative_directory)
+
+
+@pytest.mark.parametrize(
+    "object_dir, expected_dir",
+    [
+        ("my/../prefix", "prefix"),
+        ("my/./prefix", "my/prefix"),
+        ("my/..prefix", "my/..prefix"),
+        ("/my/prefix", "my/prefix"),
+    ],
+    ids=["collapsed_parent", "current_dir", "dotted_name", "leading_delimiter"],
+)
+def test_safe_paths_do_not_raise(tmp_path, object_dir, expected_dir):
+    fs.check_for_path_traversal(fs.get_relative_directory(object_dir, "/"))
+    result = fs.create_destination_directory(
+        download_dir=tmp_path, delimiter="/", object_dir=object_dir
+    )
+    assert result.resolve() == tmp_path / expected_dir
+    assert result.is_dir()
+
+
+def test_destination_directory_is_only_created_once_per_run(tmp_path, mocker):
+    created_directories = fs.CreatedDirectories()
+    mkdir = mocker.patch.object(Path, "mkdir")
+    for _ in range(3):
+        fs.create_destination_directory(
+            download_dir=tmp_path,
+            delimiter="/",
+            object_dir="my/test/prefix",
+            created_directories=created_directories,
+        )
+    mkdir.assert_called_once_with(parents=True, exist_ok=True)
+
+
+def test_removed_destination_directory_is_created_by_next_run(tmp_path):
+    for _ in range(2):
+        result = fs.create_destination_directory(
+            download_dir=tmp_path,
+            delimiter="/",
+            object_dir="my/test/prefix",
+            created_directories=fs.CreatedDirectories(),
+        )
+        assert result.is_dir()
+        shutil.rmtree(tmp_path / "my")
@@ -1,18 +1,29 @@
+import re
 import threading
 from pathlib import Path
+from typing import Optional, Union
 
 import boto3
 import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
 from mypy_boto3_s3.client import S3Client
 
 from s3fetch import s3
 from s3fetch.exceptions import (
     InvalidCredentialsError,
+    PathTraversalError,
+    PermissionError,
     PrefixDoesNotExistError,
     RegexError,
     S3FetchQueueClosed,
+    S3FetchQueueEmpty,
 )
 
+DIGIT_RE = re.compile(r"\d")
+MY_PREFIX_RE = re.compile(r"^my_")
+WORD_RE = re.compile(r"\w")
+
 
 def test_create_download_queue():
     queue = s3.get_download_queue()
@@ -26,14 +37,29 @@ def test_queue_raises_exception_when_sentinel_value_found():
         queue.get()
 
 
-@pytest.mark.parametrize("delimiter", ["/", ":"])
+def test_queue_keeps_raising_exception_after_sentinel_value_found():
+    queue = s3.get_download_queue()
+    queue.close()
+    for _ in range(3):
+        with pytest.raises(S3FetchQueueClosed):
+            queue.get()
+    assert queue.queue.empty()
+
+
+def test_queue_raises_exception_when_empty():
+    queue = s3.get_download_queue()
+    with pytest.raises(S3FetchQueueEmpty):
+        queue.get()
+
+
+@pytest.mark.parametrize("delimiter", ["/", ":", "::"])
 def test_exclude_directory_from_objects(delimiter: str):
     key = f"small_files{delimiter}"
     result = s3.check_if_key_is_directory(key=key, delimiter=delimiter)
     assert result is True
 
 
-@pytest.mark.parametrize("delimiter", ["/", ":"])
+@pytest.mark.parametrize("delimiter", ["/", ":", "::"])
 def test_not_excluding_non_directory_from_objects(delimiter: str):
     key = f"small_files{delimiter}my_photo"
     result = s3.check_if_key_is_directory(key=key, delimiter=delimiter)
@@ -42,16 +68,37 @@ def test_not_excluding_non_directory_from_objects(delimiter: str):
 
 @pytest.mark.parametrize("key,", ["my_test_file", "my_dir/my_test_file"])
 def test_skip_keys_containing_only_letters(key: str):
-    result = s3.filter_by_regex(key=key, regex=r"\d")
+    result = s3.filter_by_regex(key=key, regex=DIGIT_RE)
     assert result is False
 
 
 @pytest.mark.parametrize("key,", ["my_test_file", "my_dir/my_test_file"])
 def test_include_keys_starting_with_my_(key: str):
-    result = s3.filter_by_regex(key=key, regex=r"^my_")
+    result = s3.filter_by_regex(key=key, regex=MY_PREFIX_RE)
     assert result is True
 
 
+def test_draining_queue_leaves_sentinel_in_place():
+    queue = s3.get_download_queue()
+    keys = ["my_test_file", "my_dir/my_test_file"]
+    for key in keys:
+        queue.put(key)
+    queue.close()
+    assert queue.drain() == keys
+    assert queue.drain() == []
+    with pytest.raises(S3FetchQueueClosed):
+        queue.get()
+
+
+def test_draining_queue_marks_keys_as_done():
+    queue = s3.get_download_queue()
+    for key in ["my_test_file", "my_dir/my_test_file"]:
+        queue.put(key)
+    queue.drain()
+    assert queue.queue.unfinished_tasks == 0
+    queue.queue.join()
+
+
 def test_putting_object_onto_download_queue():
     queue = s3.get_download_queue()
     key = "my_test_file"
@@ -60,13 +107,14 @@ def test_putting_object_onto_download_queue():
     queue.close()
 
 
-def test_listing_objects_in_bucket_and_adding_objects_to_queue(s3_client: S3Client):
+def test_listing_objects_in_bucket_and_adding_objects_to_queue(
+    s3_client: S3Client, exit_event: threading.Event
+):
     bucket = "my_bucket"
     queue = s3.get_download_queue()
     key = "my_test_file"
     s3_client.create_bucket(Bucket=bucket)
     s3_client.put_object(Bucket=bucket, Key=key, Body=b"test data")
-    exit_event = threading.Event()
 
     s3.list_objects(
         client=s3_client,
@@ -85,13 +133,15 @@ def test_listing_objects_in_bucket_and_adding_objects_to_queue(s3_client: S3Clie
         queue.get()
 
 
-def test_adding_single_directory_key_to_queue(s3_client: S3Client):
+def test_listing_objects_compiles_regex_once(
+    s3_client: S3Client, exit_event: threading.Event
+):
     bucket = "my_bucket"
     queue = s3.get_download_queue()
-    key = "my_test_file/"
     s3_client.create_bucket(Bucket=bucket)
-    s3_client.put_object(Bucket=bucket, Key=key, Body=b"test data")
-    exit_event = threading.Event()
+    for key in ["my_file_1", "my_file_2", "other_file"]:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=b"test data")
+    s3.compile_regex.cache_clear()
 
     s3.list_objects(
         client=s3_client,
@@ -99,26 +149,123 @@ def test_adding_single_directory_key_to_queue(s3_client: S3Client):
         bucket=bucket,
         prefix="",
         delimiter="/",
+        regex=r"^my_",
+        exit_event=exit_event,
+    )
+
+    assert queue.drain() == ["my_file_1", "my_file_2"]
+    cache_info = s3.compile_regex.cache_info()
+    assert (cache_info.hits, cache_info.misses) == (0, 1)
+
+
+def test_listing_objects_with_invalid_regex(exit_event: threading.Event, mocker):
+    client = mocker.Mock()
+    with pytest.raises(RegexError):
+        s3.list_objects(
+            client=client,
+            queue=s3.get_download_queue(),
+            bucket="my_bucket",
+            prefix="",
+            delimiter="/",
+            regex=r"[",
+            exit_event=exit_event,
+        )
+    client.get_paginator.assert_not_called()
+
+
+def test_creating_the_thread_to_list_objects(exit_event: threading.Event, mocker):
+    thread_class = mocker.patch.object(s3.threading, "Thread", autospec=True)
+    client = mocker.sentinel.client
+    queue = s3.get_download_queue()
+
+    thread = s3.create_list_objects_thread(
+        bucket="my_bucket",
+        prefix="",
+        client=client,
+        download_queue=queue,
+        delimiter="/",
         regex=None,
         exit_event=exit_event,
     )
 
-    queue.close()
+    thread_class.assert_called_once_with(
+        name="list_objects",
+        target=s3.list_objects,
+        kwargs={
+            "bucket": "my_bucket",
+            "prefix": "",
+            "client": client,
+            "queue": queue,
+            "delimiter": "/",
+            "regex": None,
+            "exit_event": exit_event,
+        },
+    )
+    assert thread is thread_class.return_value
+    thread.start.assert_called_once_with()
+
+
+def test_adding_single_directory_key_to_queue(exit_event: threading.Event):
+    # Only the listing matters here, so stub it rather than putting an object into
+    # the mocked bucket.
+    bucket = "my_bucket"
+    queue = s3.get_download_queue()
+    key = "my_test_file/"
+    s3_client = boto3.client("s3", region_name="us-east-1")
+    stubber = Stubber(s3_client)
+    stubber.add_response(
+        "list_objects_v2",
+        {"Contents": [{"Key": key}], "IsTruncated": False},
+        {"Bucket": bucket, "Prefix": ""},
+    )
+
+    with stubber:
+        s3.list_objects(
+            client=s3_client,
+            queue=queue,
+            bucket=bucket,
+            prefix="",
+            delimiter="/",
+            regex=None,
+            exit_event=exit_event,
+        )
+    stubber.assert_no_pending_responses()
+
+    assert queue.drain() == []
 
     with pytest.raises(S3FetchQueueClosed):
         queue.get()
 
 
-def test_listing_objects_with_no_credentials():
-    # Don't import mocked S3 client here as we want the credentials to be invalid.
+@pytest.mark.parametrize(
+    "error_code, http_status_code, expected_exception",
+    [
+        ("InvalidAccessKeyId", 403, InvalidCredentialsError),
+        ("AccessDenied", 403, PermissionError),
+        ("NoSuchBucket", 404, ClientError),
+    ],
+)
+def test_listing_objects_with_client_error(
+    error_code: str,
+    http_status_code: int,
+    expected_exception: type,
+    exit_event: threading.Event,
+):
+    # Stub the response rather than using the mocked S3 client as we want the
+    # request to be rejected.
     s3_client = boto3.client("s3", region_name="us-east-1")
+    stubber = Stubber(s3_client)
+    stubber.add_client_error(
+        "list_objects_v2",
+        service_error_code=error_code,
+        http_status_code=http_status_code,
+    )
 
     bucket = "my_bucket"
     queue = s3.get_download_queue()
     queue.close()
-    exit_event = threading.Event()
 
-    with pytest.raises(InvalidCredentialsError):
+    with stubber, pytest.raises(expected_exception):
         s3.list_objects(
             client=s3_client,
             queue=queue,
@@ -130,13 +277,14 @@ def test_listing_objects_with_no_credentials():
         )
 
 
-def test_calling_exit_event_while_listing_objects(s3_client: S3Client):
+def test_calling_exit_event_while_listing_objects(
+    s3_client: S3Client, exit_event: threading.Event
+):
     bucket = "my_bucket"
     queue = s3.get_download_queue()
     key = "my_test_file"
     s3_client.create_bucket(Bucket=bucket)
     s3_client.put_object(Bucket=bucket, Key=key, Body=b"test data")
-    exit_event = threading.Event()
     exit_event.set()
 
     with pytest.raises(SystemExit):
@@ -152,8 +300,7 @@ def test_calling_exit_event_while_listing_objects(s3_client: S3Client):
     queue.close()
 
 
-def test_exit_requested():
-    exit_event = threading.Event()
+def test_exit_requested(exit_event: threading.Event):
     assert s3.exit_requested(exit_event=exit_event) is False
     exit_event.set()
     assert s3.exit_requested(exit_event=exit_event) is True
@@ -170,6 +317,8 @@ def test_exit_requested():
         ("my_dir:my_test_file:", ":", True),
         ("my_dir/my_test_file", "/", False),
         ("my_dir:my_test_file", ":", False),
+        ("/", "/", True),
+        ("my_dir::my_test_file:", "::", False),
     ],
 )
 def test_excluding_directory_objects_from_download_queue(
@@ -179,17 +328,20 @@ def test_excluding_directory_objects_from_download_queue(
     assert result is expected_result
 
 
-def test_excluding_objects_due_to_regex():
-    delimiter = "/"
-    key = "my_test_file"
-
-    regex = r"\d"
-    result = s3.exclude_object(key=key, delimiter=delimiter, regex=regex)
-    assert result is True
-
-    regex = r"\w"
-    result = s3.exclude_object(key=key, delimiter=delimiter, regex=regex)
-    assert result is False
+@pytest.mark.parametrize(
+    "regex, expected_result",
+    [
+        pytest.param(r"\d", True, id="digit"),
+        pytest.param(r"\w", False, id="word"),
+        pytest.param(DIGIT_RE, True, id="precompiled_digit"),
+        pytest.param(WORD_RE, False, id="precompiled_word"),
+    ],
+)
+def test_excluding_objects_due_to_regex(
+    regex: Union[str, re.Pattern], expected_result: bool
+):
+    result = s3.exclude_object(key="my_test_file", delimiter="/", regex=regex)
+    assert result is expected_result
 
 
 def test_filtering_by_regex_throws_exception():
@@ -200,6 +352,21 @@ def test_filtering_by_regex_throws_exception():
         s3.filter_by_regex(key=key, regex=regex)
 
 
+def test_compiled_regex_is_cached():
+    s3.compile_regex.cache_clear()
+    for key in ["my_test_file", "my_dir/my_test_file"]:
+        s3.filter_by_regex(key=key, regex=r"^my_")
+    assert s3.compile_regex.cache_info().hits == 1
+
+
+def test_invalid_regex_is_not_cached():
+    s3.compile_regex.cache_clear()
+    for _ in range(2):
+        with pytest.raises(RegexError):
+            s3.compile_regex(r"[")
+    assert s3.compile_regex.cache_info().currsize == 0
+
+
 @pytest.mark.parametrize(
     "prefix,delimiter,key,expected_result",
     [
@@ -211,6 +378,8 @@ def test_filtering_by_regex_throws_exception():
         ("my:test:prefix:", ":", "my:test:prefix:my_test_file", "my_test_file"),
         ("my:test:prefix", ":", "my:test:prefix:my_test_file", "prefix:my_test_file"),
         ("my:test:pre", ":", "my:test:prefix:my_test_file", "prefix:my_test_file"),
+        ("my", "/", "my/test/prefix/my_test_file", "my/test/prefix/my_test_file"),
+        ("my::test::", "::", "my::test::my_test_file", "my_test_file"),
     ],
 )
 def test_rolling_up_object_key_with_valid_prefix(
@@ -261,20 +430,31 @@ def test_splitting_object_key_into_local_directory_and_filename(
 
 
 @pytest.mark.parametrize(
-    "use_threads, max_concurrency",
+    "use_threads, max_concurrency, max_bandwidth",
     [
-        (True, 10),
-        (True, 99),
-        (False, 1),
+        (True, 10, None),
+        (True, 99, None),
+        (False, 1, None),
+        (True, 10, 1_000_000),
     ],
 )
-def test_creating_s3_transfer_config(use_threads: bool, max_concurrency: int):
+def test_creating_s3_transfer_config(
+    use_threads: bool, max_concurrency: int, max_bandwidth: Optional[int]
+):
     result = s3.create_s3_transfer_config(
         use_threads=use_threads,
         max_concurrency=max_concurrency,
+        max_bandwidth=max_bandwidth,
     )
     assert result.max_request_concurrency == max_concurrency
     assert result.use_threads == use_threads
+    assert result.max_bandwidth == max_bandwidth
+    assert result.io_chunksize == s3.DEFAULT_S3TRANSFER_IO_CHUNKSIZE
+
+
+def test_creating_s3_transfer_config_with_io_chunksize():
+    result = s3.create_s3_transfer_config(io_chunksize=64 * 1024)
+    assert result.io_chunksize == 64 * 1024
 
 
 def test_s3_transfer_config_raises_exception():
@@ -282,7 +462,9 @@ def test_s3_transfer_config_raises_exception():
         s3.create_s3_transfer_config(use_threads=True, max_concurrency=0)
 
 
-def test_download_object(tmp_path: Path, s3_client: S3Client):
+def test_download_object(
+    tmp_path: Path, s3_client: S3Client, exit_event: threading.Event
+):
     bucket = "my_bucket"
     key = "my_test_file"
     completion_queue = s3.get_completion_queue()
@@ -292,11 +474,148 @@ def test_download_object(tmp_path: Path, s3_client: S3Client):
         client=s3_client,
         bucket=bucket,
         key=key,
-        exit_event=threading.Event(),
+        exit_event=exit_event,
         delimiter="/",
         prefix="",
         download_dir=tmp_path,
         download_config={},  # TODO: Fix
         completed_queue=completion_queue,
     )
-    # TODO: Read data from downloaded file and validate it
+    assert (tmp_path / key).read_bytes() == b"test data"
+
+
+@pytest.mark.parametrize(
+    "key, delimiter",
+    [
+        ("../../evil", "/"),
+        ("..:..:evil", ":"),
+        ("../../evil", ":"),
+        ("safe:../../evil", ":"),
+        ("/etc/evil", ":"),
+    ],
+    ids=[
+        "directory",
+        "custom_delimiter_directory",
+        "filename",
+        "nested_filename",
+        "absolute_filename",
+    ],
+)
+@pytest.mark.parametrize("dry_run", [False, True], ids=["download", "dry_run"])
+def test_path_traversal_raises_exception(
+    tmp_path: Path,
+    exit_event: threading.Event,
+    mocker,
+    key: str,
+    delimiter: str,
+    dry_run: bool,
+):
+    client = mocker.Mock()
+    completion_queue = s3.get_completion_queue()
+    with pytest.raises(PathTraversalError):
+        s3.download(
+            client=client,
+            bucket="my_bucket",
+            key=key,
+            exit_event=exit_event,
+            delimiter=delimiter,
+            prefix="",
+            download_dir=tmp_path,
+            download_config={},
+            completed_queue=completion_queue,
+            dry_run=dry_run,
+        )
+    client.download_file.assert_not_called()
+    with pytest.raises(S3FetchQueueEmpty):
+        completion_queue.get()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_in_dry_run_mode(tmp_path: Path, exit_event: threading.Event, mocker):
+    key = "my/test/prefix/my_test_file"
+    client = mocker.Mock()
+    completion_queue = s3.get_completion_queue()
+
+    s3.download(
+        client=client,
+        bucket="my_bucket",
+        key=key,
+        exit_event=exit_event,
+        delimiter="/",
+        prefix="",
+        download_dir=tmp_path,
+        download_config={},
+        completed_queue=completion_queue,
+        dry_run=True,
+    )
+
+    assert completion_queue.get() == key
+    client.download_file.assert_not_called()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize(
+    "uri, expected_result",
+    [
+        ("s3://my-bucket/my/object", "my-bucket/my/object"),
+        ("s3://my-bucket", "my-bucket"),
+        ("my-bucket/my/object", "my-bucket/my/object"),
+        ("my-bucket/s3://my/object", "my-bucket/s3://my/object"),
+    ],
+)
+def test_trimming_schema_from_uri(uri: str, expected_result: str):
+    assert s3.trim_schema_from_uri(uri) == expected_result
+
+
+@pytest.mark.parametrize(
+    "uri, delimiter, expected_result",
+    [
+        ("s3://my-bucket/my/object", "/", ("my-bucket", "my/object")),
+        ("s3://my-bucket/", "/", ("my-bucket", "")),
+        ("s3://my-bucket", "/", ("my-bucket", "")),
+        ("my-bucket/my/object", "/", ("my-bucket", "my/object")),
+        ("s3://my-bucket:my:object", ":", ("my-bucket", "my:object")),
+    ],
+)
+def test_splitting_uri_into_bucket_and_prefix(
+    uri: str, delimiter: str, expected_result: tuple
+):
+    assert s3.split_uri_into_bucket_and_prefix(uri, delimiter) == expected_result
+
+
+def test_download_threads_stop_when_queue_is_closed(
+    tmp_path, s3_client: S3Client, exit_event: threading.Event
+):
+    key = "my_test_file"
+    download_queue = s3.get_download_queue()
+    download_queue.put(key)
+    download_queue.close()
+    completed_queue = s3.get_download_queue()
+
+    result = s3.create_download_threads(
+        client=s3_client,
+        threads=1,
+        download_queue=download_queue,
+        completed_queue=completed_queue,
+        exit_event=exit_event,
+        bucket="my_bucket",
+        prefix="",
+        download_dir=tmp_path,
+        delimiter="/",
+        download_config={},
+        callback=None,
+        dry_run=True,
+    )
+
+    assert result == (1, [])
+    assert completed_queue.get() == key
+
+
+@pytest.mark.parametrize("regex", [r"\d", r"^my_", r"[A-Z]", r"_file$"])
+@pytest.mark.parametrize(
+    "key", ["my_test_file", "my_dir/my_test_file", "File_2", "my_file/", "a"]
+)
+def test_filtering_by_regex_matches_re_search(key: str, regex: str):
+    expected_result = re.search(regex, key) is not None
+    assert s3.filter_by_regex(key=key, regex=regex) is expected_result
+    assert s3.filter_by_regex(key=key, regex=re.compile(regex)) is expected_result
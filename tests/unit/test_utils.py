@@ -1,3 +1,5 @@
+import os
+
 from s3fetch import utils
 
 
@@ -8,3 +10,20 @@ def test_create_exit_event():
     assert exit_event.is_set() is True
     exit_event.clear()
     assert exit_event.is_set() is False
+
+
+def test_get_available_threads_uses_sched_getaffinity(monkeypatch):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 1, 2}, raising=False)
+    assert utils.get_available_threads() == 3
+
+
+def test_get_available_threads_falls_back_to_cpu_count(monkeypatch):
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(os, "cpu_count", lambda: 6)
+    assert utils.get_available_threads() == 6
+
+
+def test_get_available_threads_defaults_to_1(monkeypatch):
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(os, "cpu_count", lambda: None)
+    assert utils.get_available_threads() == 1